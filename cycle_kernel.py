@@ -0,0 +1,104 @@
+"""
+가열로 사이클 탐색 JIT 커널 (furnace_analyzer.py에서 사용)
+
+Streamlit은 매 상호작용마다 메인 스크립트를 다시 실행하므로, 스크립트 안에서 정의한 @njit 함수는
+재실행마다 새로 만들어져 컴파일 캐시를 다시 불러와야 합니다. 커널을 import되는 모듈로 분리해
+프로세스당 한 번만 로드/컴파일되도록 합니다. 커널은 GIL을 해제(nogil)하므로 가열로별 스레드에서 병렬로 실행됩니다.
+"""
+import numpy as np
+
+# Numba가 설치된 경우 사이클 탐색 루프를 JIT 컴파일하여 사용 (미설치 시 호출 측에서 NumPy/pandas 로직으로 동작)
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+@njit(cache=True, nogil=True)
+def find_cycle_kernel(t_ns, temp, is_holding, lo, start_temps, temp_start, duration_min_ns, temp_end, check_strict_start, temp_rise_threshold, time_window_size, check_offset_ns):
+    """
+    analyze_cycle과 동일한 4단계 조건을 lo 이후 구간에 대해 배열 루프로 수행합니다.
+    t_ns: int64 ns 시각 배열, temp: float32 온도 배열 (NumPy 경로와 같은 float32 연산으로 승온폭 계산)
+    is_holding: 홀딩 온도 범위 마스크 (호출 측에서 가열로당 한 번 계산)
+    반환: (시작 idx, 종료 idx, 홀딩 종료 idx, 시작 온도 후보 idx), 사이클이 없으면 모두 -1
+    """
+    n = len(t_ns)
+    for c in range(len(start_temps)):
+        current_temp_start = start_temps[c]
+        
+        # 1. 시작점 찾기
+        start_idx = -1
+        for i in range(lo, n):
+            if temp[i] <= current_temp_start:
+                if not check_strict_start:
+                    start_idx = i
+                    break
+                # 장입 후 승온: i부터 time_window_size 행 뒤까지의 온도 상승량 확인 (최소 5행)
+                j = min(i + time_window_size, n - 1)
+                if j - i + 1 >= 5 and temp[j] - temp[i] >= temp_rise_threshold:
+                    start_idx = i
+                    break
+        if start_idx < 0: continue
+        
+        # 2. 홀딩 구간 찾기 (시작 시각 이후, duration_min_ns 이상 지속된 첫 번째 연속 구간)
+        holding_end_idx = -1
+        run_start = -1
+        for i in range(start_idx + 1, n):
+            if t_ns[i] <= t_ns[start_idx]: continue
+            if is_holding[i]:
+                if run_start < 0: run_start = i
+                if i == n - 1 and t_ns[i] - t_ns[run_start] >= duration_min_ns:
+                    holding_end_idx = i
+            elif run_start >= 0:
+                if t_ns[i - 1] - t_ns[run_start] >= duration_min_ns:
+                    holding_end_idx = i - 1
+                    break
+                run_start = -1
+        if holding_end_idx < 0: continue
+        
+        # 3. 종료점 찾기
+        end_idx = -1
+        for i in range(holding_end_idx + 1, n):
+            if t_ns[i] > t_ns[holding_end_idx] and temp[i] <= temp_end:
+                end_idx = i
+                break
+        if end_idx < 0: continue
+        
+        # 4. 사이클 유효성 체크 (시작 2시간 후 ~ 종료 전 저온 복귀 여부)
+        if check_strict_start:
+            check_start_ns = t_ns[start_idx] + check_offset_ns
+            abnormal = False
+            for i in range(start_idx, end_idx):
+                if t_ns[i] >= check_start_ns and t_ns[i] < t_ns[end_idx] and temp[i] < temp_start:
+                    abnormal = True
+                    break
+            if abnormal: continue
+        
+        return start_idx, end_idx, holding_end_idx, c
+    
+    return -1, -1, -1, -1
+
+@njit(cache=True, nogil=True)
+def detect_all_cycles(t_ns, temp, is_holding, start_temps, temp_start, duration_min_ns, temp_end, check_strict_start, temp_rise_threshold, time_window_size, check_offset_ns):
+    """가열로 전체 센서 배열에서 사이클을 순서대로 모두 찾아 (시작, 종료, 홀딩 종료, 시작 온도 후보) idx 배열로 반환합니다."""
+    n = len(t_ns)
+    max_cycles = n // 3 + 1
+    start_idx = np.empty(max_cycles, dtype=np.int64)
+    end_idx = np.empty(max_cycles, dtype=np.int64)
+    holding_end_idx = np.empty(max_cycles, dtype=np.int64)
+    start_temp_idx = np.empty(max_cycles, dtype=np.int64)
+    count = 0
+    pos = 0
+    while pos < n:
+        s, e, h, c = find_cycle_kernel(t_ns, temp, is_holding, pos, start_temps, temp_start, duration_min_ns, temp_end, check_strict_start, temp_rise_threshold, time_window_size, check_offset_ns)
+        if s < 0: break
+        start_idx[count] = s
+        end_idx[count] = e
+        holding_end_idx[count] = h
+        start_temp_idx[count] = c
+        count += 1
+        # 다음 탐색은 현재 사이클 종료 시각 이후부터
+        pos = np.searchsorted(t_ns, t_ns[e], side='right')
+    return start_idx[:count], end_idx[:count], holding_end_idx[:count], start_temp_idx[:count]
@@ -1,13 +1,29 @@
 import streamlit as st
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg') # 서버 렌더링 전용 비대화형 백엔드
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import matplotlib.font_manager as fm
 from fpdf import FPDF
-import tempfile
+from fpdf.enums import XPos, YPos
 import os
-from datetime import timedelta
+import io
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 import numpy as np
 import re # 파일 이름 파싱을 위해 re 모듈 추가
+import importlib.util
+
+# 설치된 경우에만 사용하는 고속 파서 (CSV: pyarrow, Excel: python-calamine)
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+HAS_CALAMINE = importlib.util.find_spec('python_calamine') is not None
+
+# Numba가 설치된 경우 사이클 탐색 루프를 JIT 컴파일하여 사용 (미설치 시 NumPy/pandas 로직으로 동작)
+# 커널은 별도 모듈에 두어 Streamlit 스크립트 재실행 시 다시 정의/컴파일되지 않도록 함 (모듈은 프로세스당 한 번만 import)
+from cycle_kernel import HAS_NUMBA, detect_all_cycles
 
 # ---------------------------------------------------------
 # 1. 앱 설정 및 폰트
@@ -16,49 +32,117 @@ st.set_page_config(page_title="가열로 다중 분석 시스템", layout="wide"
 
 # 폰트 설정
 FONT_FILE = 'NanumGothic.ttf'
-HAS_KOREAN_FONT = False
-try:
-    if os.path.exists(FONT_FILE):
-        font_prop = fm.FontProperties(fname=FONT_FILE)
-        plt.rcParams['font.family'] = font_prop.get_name()
-        HAS_KOREAN_FONT = True
-    else:
-        # 폰트 파일이 없는 경우, 기본 폰트 설정 유지 (대부분의 시스템에서 산세리프 폰트로 대체됨)
+
+@st.cache_resource(show_spinner=False)
+def init_fonts():
+    """차트 폰트와 rcParams를 설정하고 한글 폰트 사용 가능 여부를 반환합니다.
+    rcParams는 프로세스 전역이므로 스크립트 재실행마다 폰트를 다시 읽지 않도록 서버 수명 동안 한 번만 수행합니다."""
+    has_korean_font = False
+    try:
+        if os.path.exists(FONT_FILE):
+            font_prop = fm.FontProperties(fname=FONT_FILE)
+            plt.rcParams['font.family'] = font_prop.get_name()
+            has_korean_font = True
+        else:
+            # 폰트 파일이 없는 경우, 기본 폰트 설정 유지 (대부분의 시스템에서 산세리프 폰트로 대체됨)
+            plt.rcParams['font.family'] = 'sans-serif'
+    except Exception:
         plt.rcParams['font.family'] = 'sans-serif'
-except Exception:
-    plt.rcParams['font.family'] = 'sans-serif'
-    
-plt.rcParams['axes.unicode_minus'] = False # 마이너스 폰트 깨짐 방지
+        
+    plt.rcParams['axes.unicode_minus'] = False # 마이너스 폰트 깨짐 방지
+    # 긴 온도/가스 트렌드 선은 화면상 겹치는 점을 합쳐 그림 (Agg 선분 렌더링 부하 감소)
+    plt.rcParams['path.simplify'] = True
+    plt.rcParams['path.simplify_threshold'] = 1.0
+    plt.rcParams['agg.path.chunksize'] = 10000
+    return has_korean_font
+
+# PDF 생성부에서도 참조하므로 모듈 수준에서 호출 (캐시 적중 시 즉시 반환)
+HAS_KOREAN_FONT = init_fonts()
 
 # ---------------------------------------------------------
 # 2. 로직: 헤더 찾기 & 데이터 로딩
 # ---------------------------------------------------------
+def read_table(file_bytes, file_name, **read_kwargs):
+    """파일 내용(bytes)을 header=None으로 읽습니다. 사용 가능한 빠른 엔진을 먼저 시도하고 실패 시 기본 파서로 대체합니다."""
+    buffer = io.BytesIO(file_bytes)
+    if file_name.endswith('.xlsx') or file_name.endswith('.xls'):
+        if HAS_CALAMINE:
+            # Rust 기반 calamine 엔진을 우선 시도 (pandas 2.2 미만 등으로 실패 시 기본 엔진으로 대체)
+            try:
+                return pd.read_excel(buffer, header=None, engine='calamine', **read_kwargs)
+            except Exception:
+                pass
+        
+        buffer.seek(0)
+        return pd.read_excel(buffer, header=None, **read_kwargs)
+    
+    if HAS_PYARROW and 'nrows' not in read_kwargs: # pyarrow 파서는 nrows 미지원
+        # 멀티스레드 pyarrow 파서를 우선 시도 (실패 시 기존 파서로 대체)
+        for encoding in ('cp949', 'utf-8'):
+            try:
+                buffer.seek(0)
+                return pd.read_csv(buffer, encoding=encoding, header=None, engine='pyarrow', **read_kwargs)
+            except Exception:
+                pass
+    
+    buffer.seek(0)
+    try:
+        # 엑셀 파일이 아닌 경우 (CSV)
+        return pd.read_csv(buffer, encoding='cp949', header=None, engine='c', low_memory=False, **read_kwargs)
+    except:
+        buffer.seek(0)
+        return pd.read_csv(buffer, encoding='utf-8', header=None, engine='c', low_memory=False, **read_kwargs)
+
+def apply_header_row(df, header_row):
+    """지정된 행을 컬럼 헤더로 설정하고 그 이전 행들은 제거합니다."""
+    if header_row < len(df):
+         # 헤더 행으로 컬럼 이름 설정하고 그 이전 행들은 제거
+        df.columns = df.iloc[header_row]
+        df = df.iloc[header_row + 1:].reset_index(drop=True)
+        # 컬럼 이름이 중복되거나 None인 경우 처리
+        df.columns = [f"{col}_{i}" if col is None else str(col).strip() for i, col in enumerate(df.columns)]
+    return df
+
 @st.cache_data
-def smart_read_file(uploaded_file, header_row=0, nrows=None):
+def peek_file(file_bytes, file_name, header_row=0, n_rows=3):
+    """컬럼 지정/미리보기용으로 제목행과 그 아래 n_rows 행만 읽어 반환합니다."""
     try:
-        # Streamlit 환경에서는 파일 객체를 다시 읽기 위해 seek(0) 필요
-        uploaded_file.seek(0) 
-        if uploaded_file.name.endswith('.xlsx') or uploaded_file.name.endswith('.xls'):
-            # header=None으로 읽어온 후, 지정된 행을 컬럼으로 설정하여 유연성 확보
-            df = pd.read_excel(uploaded_file, header=None, nrows=nrows + header_row + 1 if nrows else None)
-        else:
-            uploaded_file.seek(0)
+        return apply_header_row(read_table(file_bytes, file_name, nrows=header_row + 1 + n_rows), header_row)
+    except Exception as e: 
+        st.error(f"파일 읽기 오류: {e}")
+        return None
+
+def count_header_lines(file_bytes, file_name, header_row):
+    """제목행까지(제목행 포함) 건너뛸 원본 줄 수를 반환합니다. (usecols 읽기의 skiprows 값)
+    CSV 파서는 빈 줄을 행으로 세지 않지만 skiprows는 원본 줄 기준이므로, 제목행 위의 빈 줄 수만큼 더함
+    (엑셀은 빈 행도 행으로 읽으므로 제목행 번호 그대로 사용)"""
+    if file_name.endswith('.xlsx') or file_name.endswith('.xls'):
+        return header_row + 1
+    
+    rows = 0
+    for line_no, line in enumerate(io.BytesIO(file_bytes)):
+        if line.strip():
+            rows += 1
+            if rows == header_row + 1:
+                return line_no + 1
+    return header_row + 1
+
+def smart_read_file(file_bytes, file_name, header_row, columns, dtype=None):
+    """업로드 파일의 내용(bytes) 전체에서 지정된 제목행 기준으로 columns 컬럼만 파싱한(usecols) DataFrame을 반환합니다.
+    dtype을 지정하면 해당 타입으로 바로 읽습니다. (컬럼 지정/미리보기는 peek_file 사용)
+    지정 타입으로 읽을 수 없는 값(문자, 천 단위 구분 기호 등)이 있으면 타입 지정 없이 다시 읽습니다."""
+    try:
+        # 제목행에서 컬럼 위치를 찾아, 제목행까지 건너뛴 뒤 필요한 컬럼만 읽음
+        header = list(peek_file(file_bytes, file_name, header_row, 0).columns)
+        positions = sorted({header.index(c) for c in columns if c in header})
+        read_kwargs = {'skiprows': count_header_lines(file_bytes, file_name, header_row), 'usecols': positions, 'names': [header[i] for i in positions]}
+        
+        if dtype:
             try:
-                # 엑셀 파일이 아닌 경우 (CSV)
-                df = pd.read_csv(uploaded_file, encoding='cp949', header=None, nrows=nrows + header_row + 1 if nrows else None)
-            except:
-                uploaded_file.seek(0)
-                df = pd.read_csv(uploaded_file, encoding='utf-8', header=None, nrows=nrows + header_row + 1 if nrows else None)
-        
-        # 지정된 행을 컬럼 헤더로 설정
-        if header_row < len(df):
-             # 헤더 행으로 컬럼 이름 설정하고 그 이전 행들은 제거
-            df.columns = df.iloc[header_row]
-            df = df.iloc[header_row + 1:].reset_index(drop=True)
-            # 컬럼 이름이 중복되거나 None인 경우 처리
-            df.columns = [f"{col}_{i}" if col is None else str(col).strip() for i, col in enumerate(df.columns)]
-        
-        return df
+                return read_table(file_bytes, file_name, dtype=dtype, **read_kwargs)
+            except Exception:
+                pass
+        return read_table(file_bytes, file_name, **read_kwargs)
     except Exception as e: 
         st.error(f"파일 읽기 오류: {e}")
         return None
@@ -66,8 +150,49 @@ def smart_read_file(uploaded_file, header_row=0, nrows=None):
 # ---------------------------------------------------------
 # 3. 핵심 로직: 사이클 감지 및 분석
 # ---------------------------------------------------------
-def analyze_cycle(daily_data, temp_start, temp_holding_min, temp_holding_max, duration_holding_min, temp_end, check_strict_start, temp_rise_threshold, time_window_minutes):
+def to_int_ns(values):
+    """datetime 배열을 int64 ns 배열로 변환합니다. (시간 비교/차이 계산을 datetime64 대신 int64로 수행)"""
+    return np.asarray(values, dtype='datetime64[ns]').view('i8')
+
+# 계량기 리셋/교체로 볼 지침 감소 기준: 직전 지침과 사이클 시작 지침 모두의 이 비율 이하(0 근처)로 떨어진 경우
+# (그 외의 감소는 일시적 이상값/흔들림으로 보고 보정하지 않음)
+GAS_RESET_RATIO = 0.1
+# 리셋 보정으로 가스 사용량을 계산한 사이클의 비고 표시 문구
+GAS_RESET_NOTE = '지침 리셋 보정'
+
+def gas_reset_correction(cycle_gas):
+    """사이클 구간(시작~종료 행)의 가스 지침에서 계량기 리셋/교체로 감소한 양의 합을 반환합니다.
+    지침이 0 근처로 떨어진 감소만 리셋으로 보며, 지침이 없는(NaN) 행은 직전 값으로 채워 계산합니다."""
+    filled = pd.Series(cycle_gas).ffill().to_numpy(dtype=np.float64)
+    prev, cur = filled[:-1], filled[1:]
+    is_reset = (cur < prev) & (cur <= GAS_RESET_RATIO * prev) & (cur <= GAS_RESET_RATIO * filled[0])
+    return float(np.sum(prev[is_reset] - cur[is_reset]))
+
+def get_start_temp_candidates(temp_start):
+    """유연한 시작점 탐색을 위한 시작 온도 후보 목록을 시도 순서대로 반환합니다."""
+    # 사용자가 설정한 temp_start를 중심으로 ±100C 범위에서 20C 간격으로 시도
+    start_temp_candidates = list(range(temp_start - 100, temp_start + 101, 20))
+    # 사용자가 설정한 값(temp_start)이 후보에 반드시 포함되도록 보장
+    if temp_start not in start_temp_candidates:
+        start_temp_candidates.insert(0, temp_start)
+    # 설정 온도보다 높은 온도부터 역순으로 시도 (가장 높은 유효 시작점을 찾기 위해), 너무 낮은 온도는 무시
+    return [t for t in sorted(set(start_temp_candidates), reverse=True) if t > 200]
+
+def cycle_kernel_params(temp_start, duration_holding_min, temp_end, check_strict_start, temp_rise_threshold, time_window_minutes):
+    """사이클 탐색 조건을 JIT 커널 인자 형식(시작 온도 후보 배열 ~ 저온 복귀 체크 오프셋)으로 변환합니다. (홀딩 범위는 is_holding 마스크로 따로 전달)"""
+    start_temps = np.array(get_start_temp_candidates(temp_start), dtype=np.float64)
+    return (start_temps, float(temp_start),
+            pd.Timedelta(hours=duration_holding_min).value, float(temp_end), bool(check_strict_start),
+            float(temp_rise_threshold), int(time_window_minutes), pd.Timedelta(hours=2).value)
+
+def get_holding_mask(temp, temp_holding_min, temp_holding_max):
+    """온도 배열에서 홀딩 온도 범위(temp_holding_min ~ temp_holding_max)에 있는 지점의 마스크를 반환합니다."""
+    return (temp >= temp_holding_min) & (temp <= temp_holding_max)
+
+def analyze_cycle(daily_data, temp_start, temp_holding_min, temp_holding_max, duration_holding_min, temp_end, check_strict_start, temp_rise_threshold, time_window_minutes, holding_mask=None):
     """
+    daily_data에서 첫 번째 유효 사이클을 NumPy 배열 연산으로 찾습니다. (Numba 미설치 시 find_unit_cycles에서 반복 호출)
+    holding_mask: daily_data 행과 같은 길이의 홀딩 범위 마스크 (가열로 단위로 미리 계산해 잘라 넘기면 재계산 생략)
     조건:
     1. 시작: temp_start 이하에서 승온이 시작되는 지점 (장입 후 승온)
     2. 홀딩: temp_holding_min ~ temp_holding_max 구간이 duration_holding_min 이상 지속
@@ -75,81 +200,79 @@ def analyze_cycle(daily_data, temp_start, temp_holding_min, temp_holding_max, du
     4. 유효성: (선택 사항) 시작 2시간 후부터 종료 시점까지 temp_start 미만으로 떨어지지 않아야 함
     """
     
-    # ------------------------------------------------------------------
-    # 유연한 시작점 탐색을 위한 반복 로직 (가장 가능성 높은 시작점 찾기)
-    # ------------------------------------------------------------------
-    # 사용자가 설정한 temp_start를 중심으로 ±100C 범위에서 20C 간격으로 시도
-    start_temp_candidates = list(range(temp_start - 100, temp_start + 101, 20))
-    # 사용자가 설정한 값(temp_start)을 첫 번째로 시도하도록 보장
-    if temp_start not in start_temp_candidates:
-        start_temp_candidates.insert(0, temp_start)
-    
     cycle_info = None
     best_start_temp = None
+
+    temp = daily_data['온도'].to_numpy(dtype=np.float32)
+    if holding_mask is None:
+        holding_mask = get_holding_mask(temp, temp_holding_min, temp_holding_max)
+
+    # 시간/온도 배열은 한 번만 추출 (홀딩 구간 탐색은 NumPy 배열 기준으로 수행)
+    t_ns = to_int_ns(daily_data['일시'].values)
+    duration_min_ns = pd.Timedelta(hours=duration_holding_min).value
+    check_offset_ns = pd.Timedelta(hours=2).value # 저온 복귀 체크 시작 오프셋 (시작 2시간 후)
+    time_window_size = int(time_window_minutes) # 분 단위
     
-    # 설정 온도보다 높은 온도부터 역순으로 시도 (가장 높은 유효 시작점을 찾기 위해)
-    for current_temp_start in sorted(set(start_temp_candidates), reverse=True):
-        if current_temp_start <= 200: continue # 너무 낮은 온도는 무시
-        
+    if check_strict_start:
+        # 각 지점에서 time_window_size 행 뒤(데이터 끝에서는 마지막 행)까지의 승온폭을 한 번에 계산
+        # 창 길이가 5행 미만인 지점은 시작점 후보에서 제외
+        n_rows = len(temp)
+        positions = np.arange(n_rows)
+        window_end = np.minimum(positions + time_window_size, n_rows - 1)
+        is_rising = ((window_end - positions + 1) >= 5) & ((temp[window_end] - temp) >= temp_rise_threshold)
+    
+    for current_temp_start in get_start_temp_candidates(temp_start):
         start_row = None
-        duration_min_td = timedelta(hours=duration_holding_min)
-        time_window_size = int(time_window_minutes) # 분 단위
 
         if check_strict_start:
             # **장입 후 승온 로직:** current_temp_start 이하로 떨어진 후 다시 급격히 승온되는 지점을 시작점으로 간주
-            daily_data['temp_diff'] = daily_data['온도'].diff().fillna(0)
-            
-            low_temp_indices = daily_data[daily_data['온도'] <= current_temp_start].index
-            
-            for idx in low_temp_indices:
-                window = daily_data.loc[idx:idx + time_window_size]
-                if len(window) < 5: continue
-                
-                if (window['온도'].iloc[-1] - window['온도'].iloc[0]) >= temp_rise_threshold: 
-                    start_row = daily_data.loc[idx]
-                    break
-            
-            if start_row is None: continue
+            is_start = (temp <= current_temp_start) & is_rising
+            start_pos = np.argmax(is_start)
+            if not is_start[start_pos]: continue
+            start_row = daily_data.iloc[start_pos]
             
         else:
-            # 기존 로직: current_temp_start 이하의 첫 지점을 시작점으로 간주
-            start_candidates = daily_data[daily_data['온도'] <= current_temp_start]
-            if start_candidates.empty: continue
-            start_row = start_candidates.iloc[0]
+            # 기존 로직: current_temp_start 이하의 첫 지점을 시작점으로 간주 (argmax는 첫 True에서 탐색 종료)
+            is_low = temp <= current_temp_start
+            start_pos = np.argmax(is_low)
+            if not is_low[start_pos]: continue
+            start_row = daily_data.iloc[start_pos]
 
         start_time = start_row['일시']
 
-        # 2. 홀딩 구간 찾기
-        post_start_data = daily_data[daily_data['일시'] > start_time].copy()
-        post_start_data['is_holding'] = (post_start_data['온도'] >= temp_holding_min) & (post_start_data['온도'] <= temp_holding_max)
-        post_start_data['group'] = (post_start_data['is_holding'] != post_start_data['is_holding'].shift()).cumsum()
-        
-        holding_end_time = None
-        for _, group in post_start_data[post_start_data['is_holding']].groupby('group'):
-            if not group.empty:
-                duration = group['일시'].max() - group['일시'].min()
-                if duration >= duration_min_td:
-                    holding_end_time = group['일시'].max()
-                    break
-                
-        if holding_end_time is None: continue
-
-        # 3. 종료점 찾기
-        post_holding_data = daily_data[daily_data['일시'] > holding_end_time]
-        end_candidates = post_holding_data[post_holding_data['온도'] <= temp_end]
+        # 2. 홀딩 구간 찾기 (홀딩 여부 마스크의 연속 구간을 run-length 방식으로 탐색)
+        post_start = np.searchsorted(t_ns, start_time.value, side='right')
+        is_holding = holding_mask[post_start:]
+        # 0/1 값의 차분으로 연속 구간 경계 탐색 (+1: 구간 시작, -1: 구간 끝)
+        edges = np.flatnonzero(np.diff(is_holding.view(np.int8), prepend=0, append=0))
+        run_starts = post_start + edges[0::2]
+        run_ends = post_start + edges[1::2] # 구간 끝 (미포함)
         
-        if end_candidates.empty: continue
+        durations_ns = t_ns[run_ends - 1] - t_ns[run_starts]
+        long_runs = np.flatnonzero(durations_ns >= duration_min_ns)
+        
+        if len(long_runs) == 0: continue
+        holding_end_ns = t_ns[run_ends[long_runs[0]] - 1]
+        holding_end_time = pd.Timestamp(holding_end_ns)
+
+        # 3. 종료점 찾기 (홀딩 종료 이후 temp_end 이하인 첫 지점: 이진 탐색으로 구간 시작을 찾고 그 뒤만 검사)
+        post_holding = np.searchsorted(t_ns, holding_end_ns, side='right')
+        is_end = temp[post_holding:] <= temp_end
+        if len(is_end) == 0: continue
+        end_offset = np.argmax(is_end)
+        if not is_end[end_offset]: continue
             
-        end_row = end_candidates.iloc[0]
+        end_row = daily_data.iloc[post_holding + end_offset]
         end_time = end_row['일시']
 
         # 4. 사이클 유효성 체크
         if check_strict_start:
-            check_start_time = start_time + timedelta(hours=2)
-            cycle_window = daily_data[(daily_data['일시'] >= check_start_time) & (daily_data['일시'] < end_time)].copy()
-            abnormal_low_temp = cycle_window[cycle_window['온도'] < temp_start]
+            check_start_ns = start_time.value + check_offset_ns
+            # 검사 구간을 이진 탐색으로 잘라낸 온도 배열에서만 저온 복귀 여부 확인
+            check_lo = np.searchsorted(t_ns, check_start_ns, side='left')
+            check_hi = np.searchsorted(t_ns, end_time.value, side='left')
             
-            if not abnormal_low_temp.empty: continue
+            if (temp[check_lo:check_hi] < temp_start).any(): continue
 
         # 유효한 사이클을 찾았을 경우
         cycle_info = {
@@ -165,103 +288,337 @@ def analyze_cycle(daily_data, temp_start, temp_holding_min, temp_holding_max, du
     
     return cycle_info, f"성공 (시작 온도 {best_start_temp}°C 기준)"
 
+def find_unit_cycles(df_sensor_unit, temp_start, temp_holding_min, temp_holding_max, duration_holding_min, temp_end, check_strict_start, temp_rise_threshold, time_window_minutes):
+    """가열로 하나의 (시간순 정렬된) 센서 데이터에서 모든 사이클 정보를 순서대로 반환합니다."""
+    sensor_times = to_int_ns(df_sensor_unit['일시'].values)
+    sensor_temps = df_sensor_unit['온도'].to_numpy(dtype=np.float32)
+    # 홀딩 범위 마스크는 설정값이 고정이므로 가열로당 한 번만 계산해 모든 사이클 탐색에서 재사용
+    holding_mask = get_holding_mask(sensor_temps, temp_holding_min, temp_holding_max)
+    cycles = []
+    
+    if HAS_NUMBA:
+        # 전체 탐색을 한 번의 JIT 커널 호출로 수행 (온도는 수집 단계의 float32 배열을 변환 없이 전달)
+        starts, ends, holding_ends, _ = detect_all_cycles(
+            sensor_times, sensor_temps, holding_mask,
+            *cycle_kernel_params(temp_start, duration_holding_min, temp_end, check_strict_start, temp_rise_threshold, time_window_minutes))
+        for s, e, h in zip(starts, ends, holding_ends):
+            cycles.append({
+                'start_row': df_sensor_unit.iloc[s],
+                'end_row': df_sensor_unit.iloc[e],
+                'holding_end': pd.Timestamp(sensor_times[h])
+            })
+        return cycles
+    
+    # Numba 미설치 시: 남은 구간에 대해 analyze_cycle을 반복 호출
+    n_rows = len(sensor_times)
+    next_pos = 0
+    processed_cycle_start_times = set() # 이미 처리된 사이클 시작 시간 기록
+    
+    # 남은 행 수(n_rows - next_pos)를 먼저 확인하여 빈 구간은 슬라이스를 만들지 않음
+    while next_pos < n_rows:
+        current_data = df_sensor_unit.iloc[next_pos:]
+        # 사이클 분석 수행 (첫 번째 유효 사이클만 찾음)
+        cycle_info, msg = analyze_cycle(current_data, temp_start, temp_holding_min, temp_holding_max, duration_holding_min, temp_end, check_strict_start, temp_rise_threshold, time_window_minutes,
+                                        holding_mask=holding_mask[next_pos:])
+        
+        if not cycle_info:
+            # 더 이상 유효한 사이클이 없거나, 조건을 너무 엄격하게 설정한 경우
+            break 
+        
+        # 이미 처리된 사이클이 아니면 결과에 추가 (중복 방지)
+        start_time_of_cycle = cycle_info['start_row']['일시']
+        if start_time_of_cycle not in processed_cycle_start_times:
+            processed_cycle_start_times.add(start_time_of_cycle)
+            cycles.append(cycle_info)
+        
+        # 다음 사이클 탐색을 위해 현재 사이클 종료 시각 직후의 행부터 남김
+        next_pos = np.searchsorted(sensor_times, cycle_info['end_row']['일시'].value, side='right')
+    
+    return cycles
+
+# 시각 컬럼에서 자주 쓰이는 형식 (첫 값으로 형식을 판별해 형식 지정 파싱에 사용)
+DATETIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y/%m/%d %H:%M:%S', '%Y/%m/%d %H:%M',
+                    '%Y.%m.%d %H:%M:%S', '%Y.%m.%d %H:%M', '%Y%m%d%H%M%S', '%Y-%m-%d')
+
+def infer_datetime_format(sample):
+    """시각 문자열 하나를 DATETIME_FORMATS와 대조하여 일치하는 형식을 반환합니다. (없으면 None)"""
+    sample = str(sample).strip()
+    for fmt in DATETIME_FORMATS:
+        try:
+            datetime.strptime(sample, fmt)
+            return fmt
+        except ValueError:
+            continue
+    return None
+
+def parse_datetime_column(values):
+    """시각 컬럼을 datetime으로 변환합니다. 문자열 컬럼은 첫 값으로 판별한 형식을 지정해 빠르게 파싱하고,
+    그 형식으로 변환되지 않은 값만 형식 추론 파싱으로 다시 변환합니다. (형식이 섞인 파일 대비)"""
+    if values.dtype == object:
+        non_null = values.dropna()
+        fmt = infer_datetime_format(non_null.iat[0]) if len(non_null) else None
+        if fmt:
+            parsed = pd.to_datetime(values, format=fmt, errors='coerce', cache=True)
+            failed = parsed.isna() & values.notna()
+            if failed.any():
+                parsed[failed] = pd.to_datetime(values[failed], errors='coerce', cache=True)
+            return parsed
+    return pd.to_datetime(values, errors='coerce', cache=True)
+
+# 파일 이름의 가열로 ID 패턴 ('가열로'로 시작하고 '호기'로 끝나는 패턴 또는 '가열로X' 패턴, 모듈 로드 시 한 번만 컴파일)
+FURNACE_ID_PATTERN = re.compile(r'(가열로\s*\d+\s*호기|가열로\s*\d+)', re.IGNORECASE)
+
 # 파일 이름에서 가열로 ID를 추출하는 헬퍼 함수
 def extract_furnace_id_from_filename(filename):
     """파일 이름에서 '가열로X호기' 또는 '가열로X' 패턴을 찾아 ID를 추출합니다."""
-    # '가열로'로 시작하고 '호기'로 끝나는 패턴 또는 '가열로X' 패턴을 찾습니다.
     # 예: 가열로 1호기_data.csv -> 가열로1호기
-    match = re.search(r'(가열로\s*\d+\s*호기|가열로\s*\d+)', filename, re.IGNORECASE)
+    match = FURNACE_ID_PATTERN.search(filename)
     if match:
         # 찾은 문자열에서 공백을 제거하고 반환
         return match.group(0).strip().replace(' ', '')
     return None
 
-def process_data(prod_files, p_header, col_p_start_time, col_p_weight, col_p_unit, 
-                 s_header_row, col_s_time, col_s_temp, col_s_gas, sensor_files, 
-                 target_cost, temp_start, temp_holding_min, temp_holding_max, duration_holding_min, temp_end, check_strict_start, use_target_cost, time_tolerance_hours, temp_rise_threshold, time_window_minutes): 
-    
-    # --- 생산실적 데이터 통합 및 전처리 ---
-    df_prod_list = []
+def get_file_signature(files, *settings):
+    """업로드 파일 내용(SHA-1)과 읽기 설정으로 통합 DataFrame 재사용 여부를 판단할 서명을 만듭니다."""
+    h = hashlib.sha1()
+    for f in files:
+        h.update(f.name.encode('utf-8'))
+        h.update(f.getvalue())
+    return h.hexdigest() + repr(settings)
+
+@st.cache_data(show_spinner=False)
+def ingest_prod_file(file_bytes, file_name, p_header, col_p_start_time, col_p_weight, col_p_unit):
+    """생산 실적 파일 하나를 읽어 컬럼 매핑/타입 변환 후 (DataFrame, 오류 메시지)로 반환합니다. (파일 내용 기준 캐시)"""
     # col_p_start_time이 None이면, 생산 실적 데이터를 장입량과 ID만 사용하도록 처리
     use_prod_time = col_p_start_time is not None
     
-    for f in prod_files:
-        f.seek(0)
-        # p_header 인수를 smart_read_file에 전달
-        df = smart_read_file(f, p_header) 
-        if df is not None:
-             try:
-                # 컬럼 매핑 및 정리 (개별 파일)
-                # col_p_start_time이 None일 경우, KeyError 방지를 위해 컬럼을 임시로 None으로 설정 후 처리
-                start_col_name = col_p_start_time if col_p_start_time else '임시_시작일시'
-                
-                df = df.rename(columns={start_col_name: '시작일시', col_p_weight: '장입량', col_p_unit: '가열로'})
-                
-                if use_prod_time:
-                    df['시작일시'] = pd.to_datetime(df['시작일시'], errors='coerce') 
-                else:
-                    # 시작일시를 사용할 수 없으므로, 모든 행에 대해 임시 키를 부여하여 개별 차지로 인식하도록 함
-                    df['시작일시'] = df.index.to_series().apply(lambda x: pd.to_datetime('2000-01-01') + timedelta(days=x)) 
-                
-                if df['장입량'].dtype == object:
-                    df['장입량'] = df['장입량'].astype(str).str.replace(',', '')
-                df['장입량'] = pd.to_numeric(df['장입량'], errors='coerce')
-                
-                df = df.dropna(subset=['장입량', '가열로']).sort_values('시작일시')
-                df_prod_list.append(df)
-             except Exception as e:
-                 st.error(f"생산 실적 파일 처리 오류 ({f.name}): {e}")
-                 return None, None, f"생산 실적 파일 처리 오류: {e}"
+    # p_header 인수를 smart_read_file에 전달 (지정된 컬럼만 읽음)
+    df = smart_read_file(file_bytes, file_name, p_header, columns=[col_p_start_time, col_p_weight, col_p_unit], dtype={col_p_weight: np.float32})
+    if df is None: return None, None
+    
+    try:
+        # 컬럼 매핑 및 정리 (개별 파일)
+        # col_p_start_time이 None일 경우, KeyError 방지를 위해 컬럼을 임시로 None으로 설정 후 처리
+        start_col_name = col_p_start_time if col_p_start_time else '임시_시작일시'
+        
+        df = df.rename(columns={start_col_name: '시작일시', col_p_weight: '장입량', col_p_unit: '가열로'})
+        
+        if use_prod_time:
+            df['시작일시'] = parse_datetime_column(df['시작일시'])
+        else:
+            # 시작일시를 사용할 수 없으므로, 모든 행에 대해 임시 키를 부여하여 개별 차지로 인식하도록 함
+            df['시작일시'] = pd.Timestamp('2000-01-01') + pd.to_timedelta(np.arange(len(df)), unit='D') # 행마다 apply하지 않고 한 번에 생성
+        
+        if df['장입량'].dtype == object:
+            df['장입량'] = df['장입량'].astype(str).str.replace(',', '')
+        df['장입량'] = pd.to_numeric(df['장입량'], errors='coerce').astype('float32') # kg 단위 장입량은 float32로 충분
+        
+        return df.dropna(subset=['장입량', '가열로']).sort_values('시작일시'), None
+    except Exception as e:
+        st.error(f"생산 실적 파일 처리 오류 ({file_name}): {e}")
+        return None, f"생산 실적 파일 처리 오류: {e}"
+
+@st.cache_data(show_spinner=False)
+def build_prod_frame(file_bytes_tuple, file_names, p_header, col_p_start_time, col_p_weight, col_p_unit):
+    """생산 실적 파일들을 하나의 DataFrame으로 통합합니다. (파일별 파싱 결과는 ingest_prod_file 캐시를 재사용)"""
+    df_prod_list = []
+    for file_bytes, file_name in zip(file_bytes_tuple, file_names):
+        df, error_msg = ingest_prod_file(file_bytes, file_name, p_header, col_p_start_time, col_p_weight, col_p_unit)
+        if error_msg: return None, error_msg
+        if df is not None: df_prod_list.append(df)
 
-    if not df_prod_list: return None, None, "유효한 생산 실적 데이터 없음"
+    if not df_prod_list: return None, "유효한 생산 실적 데이터 없음"
     
-    df_prod = pd.concat(df_prod_list, ignore_index=True)
+    return pd.concat(df_prod_list, ignore_index=True), None
+
+@st.cache_data(show_spinner=False)
+def ingest_sensor_file(file_bytes, file_name, s_header_row, col_s_time, col_s_temp, col_s_gas):
+    """센서 파일 하나를 읽어 가열로 ID 부여/타입 변환/정렬/중복 제거 후 반환합니다. (파일 내용 기준 캐시)"""
+    # 지정된 3개 컬럼만 읽고, 온도/가스지침은 숫자 타입으로 바로 파싱 (가스지침은 누적값이라 float64)
+    df = smart_read_file(file_bytes, file_name, s_header_row, columns=[col_s_time, col_s_temp, col_s_gas],
+                         dtype={col_s_temp: np.float32, col_s_gas: np.float64})
+    if df is None: return None
     
-    # --- 센서 데이터 통합 및 전처리 (이전과 동일) ---
-    df_list = []
-    for f in sensor_files:
-        f.seek(0) # 파일 포인터 초기화
-        df = smart_read_file(f, s_header_row)
-        
-        if df is not None:
-            
-            # 1. 파일 이름에서 가열로 ID 추출
-            unit_id = extract_furnace_id_from_filename(f.name)
-            if not unit_id:
-                st.warning(f"경고: 센서 파일 {f.name}에서 유효한 가열로 ID를 찾을 수 없습니다. (패턴: 가열로X호기 또는 가열로X). 이 파일은 분석에서 제외됩니다.")
-                continue
+    # 1. 파일 이름에서 가열로 ID 추출
+    unit_id = extract_furnace_id_from_filename(file_name)
+    if not unit_id:
+        st.warning(f"경고: 센서 파일 {file_name}에서 유효한 가열로 ID를 찾을 수 없습니다. (패턴: 가열로X호기 또는 가열로X). 이 파일은 분석에서 제외됩니다.")
+        return None
 
-            try:
-                # 2. 컬럼 이름 정규화
-                df.columns = [str(c).strip() for c in df.columns]
+    try:
+        # 2. 컬럼 이름 정규화
+        df.columns = [str(c).strip() for c in df.columns]
 
-                # 3. 컬럼 매핑
-                df = df.rename(columns={col_s_time: '일시', col_s_temp: '온도', col_s_gas: '가스지침'})
+        # 3. 컬럼 매핑
+        df = df.rename(columns={col_s_time: '일시', col_s_temp: '온도', col_s_gas: '가스지침'})
 
-                # 4. 가열로 ID 컬럼 추가
-                df['가열로'] = unit_id
+        # 4. 가열로 ID 컬럼 추가
+        df['가열로'] = unit_id
 
-                # 5. 타입 변환 및 정리
-                df['일시'] = pd.to_datetime(df['일시'], errors='coerce')
-                df['온도'] = pd.to_numeric(df['온도'], errors='coerce')
-                df['가스지침'] = pd.to_numeric(df['가스지침'], errors='coerce')
-                
-                # 시간 컬럼 기준으로 정렬하고 NaN 제거
-                df = df.dropna(subset=['일시', '가열로']).sort_values('일시')
+        # 5. 타입 변환 및 정리
+        df['일시'] = parse_datetime_column(df['일시'])
+        # 온도(°C)는 float32로 충분 (이후 모든 배열 스캔의 메모리 대역폭 절반)
+        # 가스지침은 누적값이라 자릿수가 커서 float64 유지 (float32는 유효숫자 약 7자리)
+        df['온도'] = pd.to_numeric(df['온도'], errors='coerce').astype('float32')
+        df['가스지침'] = pd.to_numeric(df['가스지침'], errors='coerce')
+        
+        # 시간 컬럼 기준으로 정렬하고 NaN 제거 (안정 정렬로 같은 일시의 행은 파일 순서 유지)
+        df = df.dropna(subset=['일시', '가열로']).sort_values('일시', kind='stable')
+        
+        # 중복 일시 제거 (가장 마지막 값 유지)
+        # 파일 하나는 가열로 ID가 모두 같고 정렬되어 있으므로, 다음 행과 일시만 비교하면 됨 (행 단위 해시 생략)
+        times = to_int_ns(df['일시'].values)
+        keep = np.ones(len(times), dtype=bool)
+        keep[:-1] = times[:-1] != times[1:]
+        return df[keep].reset_index(drop=True)
+    except Exception as e:
+        st.error(f"센서 데이터 매핑 오류 (파일: {file_name}): {e}")
+        return None
+
+@st.cache_data(show_spinner=False)
+def build_sensor_frame(file_bytes_tuple, file_names, s_header_row, col_s_time, col_s_temp, col_s_gas):
+    """센서 파일들을 하나의 DataFrame으로 통합합니다. (파일별 파싱 결과는 ingest_sensor_file 캐시를 재사용)"""
+    df_list = []
+    for file_bytes, file_name in zip(file_bytes_tuple, file_names):
+        df = ingest_sensor_file(file_bytes, file_name, s_header_row, col_s_time, col_s_temp, col_s_gas)
+        if df is not None: df_list.append(df)
                 
-                # 중복 일시 제거 (가장 마지막 값 유지)
-                df = df.drop_duplicates(subset=['일시', '가열로'], keep='last').reset_index(drop=True)
+    if not df_list: return None
+    
+    # 같은 가열로의 파일이 여러 개일 수 있으므로 가열로/일시 기준으로 정렬 (사이클 탐색은 시간순 정렬을 전제로 함)
+    return pd.concat(df_list, ignore_index=True).sort_values(['가열로', '일시'], kind='stable').reset_index(drop=True)
+
+def match_nearest_charges(prod_times, prod_charges, cycle_starts_ns, tolerance_ns):
+    """정렬된 생산 실적 시작 시각에서 각 사이클 시작 시각과 가장 가까운 차지의 장입량을 한 번에 찾습니다.
+    거리가 같거나 같은 시각의 차지가 여러 행이면 앞쪽 차지를 선택하고, tolerance_ns를 넘으면 매칭 실패로 장입량 0을 반환합니다."""
+    n_prod = len(prod_times)
+    if n_prod == 0:
+        return np.zeros(len(cycle_starts_ns), dtype=prod_charges.dtype)
+    
+    # 삽입 위치의 좌우 이웃 중 더 가까운 쪽 선택
+    match_pos = np.searchsorted(prod_times, cycle_starts_ns)
+    left = np.maximum(match_pos - 1, 0)
+    right = np.minimum(match_pos, n_prod - 1)
+    use_left = (match_pos == n_prod) | ((match_pos > 0) & (cycle_starts_ns - prod_times[left] <= prod_times[right] - cycle_starts_ns))
+    # 같은 시각의 생산 실적이 여러 행이면 그중 첫 행 선택 (오른쪽 이웃은 searchsorted가 이미 첫 행을 반환)
+    left = np.searchsorted(prod_times, prod_times[left], side='left')
+    match_pos = np.where(use_left, left, right)
+    
+    # 매칭 기준 검증: 매칭된 생산 실적의 시작 시각이 센서 사이클 시작 시각과 허용 범위 이내여야 함
+    within = np.abs(prod_times[match_pos] - cycle_starts_ns) <= tolerance_ns
+    return np.where(within, prod_charges[match_pos], 0)
+
+# 결과 DataFrame 컬럼 순서 (결과는 컬럼별 리스트로 누적하여 행 단위 타입 추론 생략)
+RESULT_COLUMNS = ('가열로', '날짜', '검침시작', '시작지침', '검침완료', '종료지침',
+                  '가스사용량(Nm3)', '장입량(kg)', '원단위', '달성여부', '비고')
+# 누적 항목: 결과 컬럼 + 리셋 보정 여부 (비고 문구 생성용)
+RESULT_FIELDS = RESULT_COLUMNS + ('리셋보정',)
+
+def analyze_unit(unit_id, df_sensor_unit, df_prod_unit, target_cost, temp_start, temp_holding_min, temp_holding_max, duration_holding_min, temp_end, check_strict_start, use_target_cost, time_tolerance_hours, temp_rise_threshold, time_window_minutes):
+    """가열로 하나의 사이클 탐색/생산 실적 매칭/원단위 계산 결과를 컬럼별 리스트(dict)로 반환합니다. (st.* 호출 없음, 스레드에서 실행)"""
+    results = {col: [] for col in RESULT_FIELDS}
+    
+    # 1. 생산 실적도 시작일시 순으로 정렬해 두고 가장 가까운 차지를 이진 탐색으로 찾음
+    df_prod_unit = df_prod_unit.dropna(subset=['시작일시']).sort_values('시작일시', kind='stable')
+    prod_times = to_int_ns(df_prod_unit['시작일시'].values)
+    prod_charges = df_prod_unit['장입량'].values
+    match_tolerance_ns = pd.Timedelta(hours=time_tolerance_hours).value
+
+    # 2. 센서 데이터 전체를 기준으로 사이클 탐색 (차지 시작 시각이 정확하지 않을 때의 핵심 로직)
+    # 센서 데이터 전체를 순회하며 모든 잠재적 사이클을 찾습니다.
+    unit_cycles = find_unit_cycles(df_sensor_unit, temp_start, temp_holding_min, temp_holding_max, duration_holding_min, temp_end, check_strict_start, temp_rise_threshold, time_window_minutes)
+    
+    # 3. 센서 사이클별 생산 실적 매칭 (가열로의 모든 사이클 시작 시각을 한 번에 매칭)
+    cycle_starts_ns = np.array([cycle_info['start_row']['일시'].value for cycle_info in unit_cycles], dtype=np.int64)
+    cycle_charges = match_nearest_charges(prod_times, prod_charges, cycle_starts_ns, match_tolerance_ns)
+    
+    # 가스 사용량은 종료/시작 지침 차이로 계산
+    gas = df_sensor_unit['가스지침'].to_numpy(dtype=np.float64)
+    cycle_start_pos = df_sensor_unit.index.get_indexer([cycle_info['start_row'].name for cycle_info in unit_cycles])
+    cycle_end_pos = df_sensor_unit.index.get_indexer([cycle_info['end_row'].name for cycle_info in unit_cycles])
+    cycle_gas_used = gas[cycle_end_pos] - gas[cycle_start_pos]
+    # 사용량이 0 이하인 사이클만 계량기 리셋 여부를 확인해 리셋 전후 사용량을 합산 (리셋이 아니면 기존처럼 제외)
+    cycle_reset = np.zeros(len(unit_cycles), dtype=bool)
+    for k in np.flatnonzero(cycle_gas_used <= 0):
+        correction = gas_reset_correction(gas[cycle_start_pos[k]:cycle_end_pos[k] + 1])
+        if correction > 0:
+            cycle_gas_used[k] += correction
+            cycle_reset[k] = True
+    
+    for cycle_info, charge_kg, gas_used, is_reset in zip(unit_cycles, cycle_charges, cycle_gas_used, cycle_reset):
+        start_time_of_cycle = cycle_info['start_row']['일시']
+        
+        # 4. 원단위 및 결과 계산
+        
+        if charge_kg <= 0:
+            pass # 장입량이 없거나 매칭 실패로 0이면 원단위 계산 불가
+
+        else:
+            start = cycle_info['start_row']
+            end = cycle_info['end_row']
+            
+            if gas_used > 0:
+                unit = gas_used / (charge_kg / 1000) # Nm3 / ton
                 
-                df_list.append(df)
-            except Exception as e:
-                st.error(f"센서 데이터 매핑 오류 (파일: {f.name}): {e}")
+                # 목표 원단위 사용 여부에 따라 달성 여부 설정
+                if use_target_cost and target_cost is not None:
+                    is_pass = unit <= target_cost
+                    achievement = 'Pass' if is_pass else 'Fail'
+                else:
+                    achievement = 'N/A'
                 
-    if not df_list: return None, None, "센서 데이터 없음"
+                # 시각 컬럼은 Timestamp 그대로 모아두고, 문자열 변환은 마지막에 컬럼 단위로 한 번만 수행
+                results['가열로'].append(unit_id)
+                results['날짜'].append(start_time_of_cycle)
+                results['검침시작'].append(start_time_of_cycle)
+                results['시작지침'].append(start['가스지침'])
+                results['검침완료'].append(end['일시'])
+                results['종료지침'].append(end['가스지침'])
+                results['가스사용량(Nm3)'].append(int(gas_used))
+                results['장입량(kg)'].append(int(charge_kg))
+                results['원단위'].append(round(unit, 2))
+                results['달성여부'].append(achievement)
+                results['비고'].append(cycle_info['holding_end'])
+                results['리셋보정'].append(is_reset)
+    
+    return results
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def split_sensor_by_unit(sensor_sig, _df_sensor):
+    """통합 센서 데이터를 가열로별로 나눈 dict를 반환합니다. (가열로/일시 순으로 정렬된 상태, 분석과 차트에서 함께 사용)
+    같은 센서 데이터(sensor_sig)면 세션 간에도 복사/직렬화 없이 같은 객체를 공유합니다."""
+    return dict(tuple(_df_sensor.groupby('가열로', sort=False)))
+
+def process_data(prod_files, p_header, col_p_start_time, col_p_weight, col_p_unit, 
+                 s_header_row, col_s_time, col_s_temp, col_s_gas, sensor_files, 
+                 target_cost, temp_start, temp_holding_min, temp_holding_max, duration_holding_min, temp_end, check_strict_start, use_target_cost, time_tolerance_hours, temp_rise_threshold, time_window_minutes): 
+    
+    # --- 생산실적/센서 데이터 통합 및 전처리 (파일 내용 기준 캐시) ---
+    # 같은 파일/설정으로 다시 분석하는 경우 세션에 보관된 DataFrame을 그대로 재사용 (캐시 조회/역직렬화 생략)
+    prod_sig = get_file_signature(prod_files, p_header, col_p_start_time, col_p_weight, col_p_unit)
+    if st.session_state.get('prod_sig') == prod_sig:
+        df_prod = st.session_state['df_prod']
+    else:
+        df_prod, error_msg = build_prod_frame(tuple(f.getvalue() for f in prod_files), tuple(f.name for f in prod_files),
+                                              p_header, col_p_start_time, col_p_weight, col_p_unit)
+        if error_msg: return None, None, error_msg
+        st.session_state['prod_sig'] = prod_sig
+        st.session_state['df_prod'] = df_prod
     
-    df_sensor = pd.concat(df_list, ignore_index=True)
+    sensor_sig = get_file_signature(sensor_files, s_header_row, col_s_time, col_s_temp, col_s_gas)
+    if st.session_state.get('sensor_sig') == sensor_sig:
+        sensor_by_unit = st.session_state['sensor_by_unit']
+    else:
+        df_sensor = build_sensor_frame(tuple(f.getvalue() for f in sensor_files), tuple(f.name for f in sensor_files),
+                                       s_header_row, col_s_time, col_s_temp, col_s_gas)
+        if df_sensor is None: return None, None, "센서 데이터 없음"
+        # 가열로별로 한 번만 분할해 보관 (가열로마다 전체 데이터를 다시 필터링하지 않도록, 통합 프레임은 따로 보관하지 않음)
+        sensor_by_unit = split_sensor_by_unit(sensor_sig, df_sensor)
+        st.session_state['sensor_sig'] = sensor_sig
+        st.session_state['sensor_by_unit'] = sensor_by_unit
     
     # --- 다중 가열로 분석 실행 ---
-    unit_ids = df_sensor['가열로'].unique()
+    unit_ids = list(sensor_by_unit)
     
     if len(unit_ids) > 20:
         return None, None, f"분석 대상 가열로가 {len(unit_ids)}개 감지되었습니다. 최대 20개까지만 분석을 지원합니다."
@@ -269,101 +626,52 @@ def process_data(prod_files, p_header, col_p_start_time, col_p_weight, col_p_uni
     if len(unit_ids) == 0:
         return None, None, "유효한 가열로 ID가 센서 데이터에서 발견되지 않았습니다."
 
-    results = []
+    # 생산 실적도 가열로별로 한 번에 분할
+    prod_by_unit = dict(tuple(df_prod.groupby('가열로', sort=False)))
     
-    for unit_id in unit_ids:
-        # 1. 가열로별 데이터 필터링
-        df_sensor_unit = df_sensor[df_sensor['가열로'] == unit_id].copy()
-        df_prod_unit = df_prod[df_prod['가열로'] == unit_id].copy()
-        
-        if df_prod_unit.empty: continue # 생산 실적이 없는 가열로는 분석 제외
-
-        # 2. 센서 데이터 전체를 기준으로 사이클 탐색 (차지 시작 시각이 정확하지 않을 때의 핵심 로직)
-        
-        current_data = df_sensor_unit.copy()
-        processed_cycle_start_times = set() # 이미 처리된 사이클 시작 시간 기록
-        
-        # 3. 센서 사이클 탐색 및 생산 실적 매칭
-        # 센서 데이터 전체를 순회하며 모든 잠재적 사이클을 찾습니다.
-        
-        while not current_data.empty:
-            # 사이클 분석 수행 (첫 번째 유효 사이클만 찾음)
-            cycle_info, msg = analyze_cycle(current_data, temp_start, temp_holding_min, temp_holding_max, duration_holding_min, temp_end, check_strict_start, temp_rise_threshold, time_window_minutes)
-            
-            if not cycle_info:
-                # 더 이상 유효한 사이클이 없거나, 조건을 너무 엄격하게 설정한 경우
-                break 
-            
-            start_time_of_cycle = cycle_info['start_row']['일시']
-
-            # 이미 처리된 사이클이면 건너뛰거나, 다음 탐색 위치로 이동 (중복 방지)
-            if start_time_of_cycle in processed_cycle_start_times:
-                next_start_index = current_data[current_data['일시'] > cycle_info['end_row']['일시']].index.min()
-                if pd.isna(next_start_index): break
-                current_data = current_data.loc[next_start_index:].copy()
-                continue
-            
-            # 4. 생산 실적 매칭 (가장 가까운 차지 매칭)
-            
-            prod_data_for_match = df_prod_unit.copy()
-            
-            # 센서 사이클 시작 시간과 생산 실적 시작 시간의 차이 계산 (절대값)
-            prod_data_for_match['diff'] = abs(prod_data_for_match['시작일시'] - start_time_of_cycle)
-            
-            # 가장 가까운 행 (가장 차이가 작은 행)을 찾음
-            closest_match = prod_data_for_match.loc[prod_data_for_match['diff'].idxmin()]
-            
-            charge_kg = closest_match['장입량']
-            
-            # 매칭 기준 검증: 매칭된 생산 실적의 시작 시각이 센서 사이클 시작 시각과 time_tolerance_hours 이내여야 함
-            match_diff = closest_match['diff']
-            
-            if match_diff > timedelta(hours=time_tolerance_hours):
-                # 매칭 실패 (허용 범위 초과) - 장입량 0으로 간주하고 원단위 계산 제외
-                charge_kg = 0 
-            
-            # 5. 원단위 및 결과 계산
-            
-            if charge_kg <= 0:
-                pass # 장입량이 없거나 매칭 실패로 0이면 원단위 계산 불가
-
-            else:
-                start = cycle_info['start_row']
-                end = cycle_info['end_row']
-                
-                gas_used = end['가스지침'] - start['가스지침']
-                if gas_used > 0:
-                    unit = gas_used / (charge_kg / 1000) # Nm3 / ton
-                    
-                    # 목표 원단위 사용 여부에 따라 달성 여부 설정
-                    if use_target_cost and target_cost is not None:
-                        is_pass = unit <= target_cost
-                        achievement = 'Pass' if is_pass else 'Fail'
-                    else:
-                        achievement = 'N/A'
-                    
-                    results.append({
-                        '가열로': unit_id,
-                        '날짜': start_time_of_cycle.strftime('%Y-%m-%d'),
-                        '검침시작': start_time_of_cycle.strftime('%Y-%m-%d %H:%M'),
-                        '시작지침': start['가스지침'],
-                        '검침완료': end['일시'].strftime('%Y-%m-%d %H:%M'),
-                        '종료지침': end['가스지침'],
-                        '가스사용량(Nm3)': int(gas_used),
-                        '장입량(kg)': int(charge_kg),
-                        '원단위': round(unit, 2),
-                        '달성여부': achievement,
-                        '비고': f"홀딩종료: {cycle_info['holding_end'].strftime('%H:%M')}"
-                    })
-            
-            # 다음 사이클 탐색을 위해 현재 사이클이 종료된 시간 이후의 데이터만 남김
-            processed_cycle_start_times.add(start_time_of_cycle)
-            next_start_index = current_data[current_data['일시'] > cycle_info['end_row']['일시']].index.min()
-            if pd.isna(next_start_index): break
-            current_data = current_data.loc[next_start_index:].copy()
+    # 생산 실적이 없는 가열로는 분석 제외
+    target_units = [unit_id for unit_id in unit_ids if unit_id in prod_by_unit]
+    
+    # 가열로별 분석은 서로 독립적이므로 스레드로 병렬 실행 (탐색 커널은 GIL을 해제하고 동작)
+    # 작업 스레드에서는 st.* 호출을 하지 않으며, 결과는 가열로 순서대로 합침
+    unit_results = []
+    if target_units:
+        with ThreadPoolExecutor(max_workers=min(len(target_units), os.cpu_count() or 1)) as executor:
+            unit_results = list(executor.map(
+                lambda unit_id: analyze_unit(unit_id, sensor_by_unit[unit_id], prod_by_unit[unit_id],
+                                             target_cost, temp_start, temp_holding_min, temp_holding_max, duration_holding_min, temp_end,
+                                             check_strict_start, use_target_cost, time_tolerance_hours, temp_rise_threshold, time_window_minutes),
+                target_units))
+    
+    results = {col: [] for col in RESULT_FIELDS}
+    for unit_result in unit_results:
+        for col in RESULT_FIELDS:
+            results[col].extend(unit_result[col])
+    
+    if not results['가열로']:
+        return pd.DataFrame(), sensor_by_unit, None
+    
+    # 컬럼별로 타입을 지정해 한 번에 DataFrame 생성
+    start_times = pd.DatetimeIndex(results['검침시작'])
+    df_result = pd.DataFrame({
+        '가열로': results['가열로'],
+        # 시각 컬럼 일괄 문자열 변환 (벡터화된 strftime)
+        '날짜': start_times.strftime('%Y-%m-%d'),
+        '검침시작': start_times.strftime('%Y-%m-%d %H:%M'),
+        '시작지침': np.array(results['시작지침'], dtype=np.float64),
+        '검침완료': pd.DatetimeIndex(results['검침완료']).strftime('%Y-%m-%d %H:%M'),
+        '종료지침': np.array(results['종료지침'], dtype=np.float64),
+        '가스사용량(Nm3)': np.array(results['가스사용량(Nm3)'], dtype=np.int64),
+        '장입량(kg)': np.array(results['장입량(kg)'], dtype=np.int64),
+        '원단위': np.array(results['원단위'], dtype=np.float64),
+        '달성여부': results['달성여부'],
+        # 리셋 보정 사이클은 시작/종료 지침 차이와 사용량이 다르므로 비고에 표시
+        '비고': ('홀딩종료: ' + pd.DatetimeIndex(results['비고']).strftime('%H:%M')
+               + np.where(results['리셋보정'], f' / {GAS_RESET_NOTE}', '')),
+    })
             
-    # 전체 센서 데이터 반환 (필터링되지 않은 원본)
-    return pd.DataFrame(results), df_sensor, None
+    # 가열로별 센서 데이터 반환 (필터링되지 않은 원본, 차트용)
+    return df_result, sensor_by_unit, None
 
 # ---------------------------------------------------------
 # 4. PDF 생성
@@ -372,23 +680,23 @@ class PDFReport(FPDF):
     def __init__(self, unit_name, *args, **kwargs): # unit_name 추가
         self.unit_name = unit_name
         super().__init__(*args, **kwargs)
-        if HAS_KOREAN_FONT: self.add_font('Nanum', '', FONT_FILE, uni=True)
+        if HAS_KOREAN_FONT: self.add_font('Nanum', '', FONT_FILE)
 
     def header(self):
-        font = 'Nanum' if HAS_KOREAN_FONT else 'Arial'
+        font = 'Nanum' if HAS_KOREAN_FONT else 'Helvetica'
         self.set_font(font, 'B' if not HAS_KOREAN_FONT else '', 14)
         # 가열로 이름 동적 사용
-        self.cell(0, 10, f"3. 가열로 {self.unit_name} 검증 DATA (개선 후)", 0, 1, 'L')
+        self.cell(0, 10, f"3. 가열로 {self.unit_name} 검증 DATA (개선 후)", align='L', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
         self.ln(5)
 
-def generate_pdf(row_data, chart_path, target, unit_name, use_target_cost): # use_target_cost 인자 추가
+def generate_pdf(row_data, chart_image, target, unit_name, use_target_cost): # use_target_cost 인자 추가 / chart_image: PNG 파일 객체(BytesIO)
     pdf = PDFReport(unit_name=unit_name) # unit_name 전달
     pdf.add_page()
-    font = 'Nanum' if HAS_KOREAN_FONT else 'Arial'
+    font = 'Nanum' if HAS_KOREAN_FONT else 'Helvetica'
     
     pdf.set_font(font, '', 12)
     # 가열로 이름 동적 사용
-    pdf.cell(0, 10, f"3.5 가열로 {unit_name} - {row_data['날짜']} (23% 절감 검증)", 0, 1, 'L')
+    pdf.cell(0, 10, f"3.5 가열로 {unit_name} - {row_data['날짜']} (23% 절감 검증)", align='L', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
     pdf.ln(5)
 
     pdf.set_fill_color(240, 240, 240)
@@ -418,8 +726,8 @@ def generate_pdf(row_data, chart_path, target, unit_name, use_target_cost): # us
     pdf.set_y(y + 12 + 15)
     
     pdf.set_font(font, '', 12)
-    pdf.cell(0, 10, "▶ 열처리 Chart (온도/가스 트렌드)", 0, 1, 'L')
-    pdf.image(chart_path, x=10, w=190)
+    pdf.cell(0, 10, "▶ 열처리 Chart (온도/가스 트렌드)", align='L', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.image(chart_image, x=10, w=190)
     
     pdf.ln(5)
     pdf.set_font(font, '', 10)
@@ -430,51 +738,121 @@ def generate_pdf(row_data, chart_path, target, unit_name, use_target_cost): # us
     else:
         report_footer = f"* 실적 원단위: {row_data['원단위']} Nm3/ton"
 
-    pdf.cell(0, 8, report_footer, 0, 1, 'R')
+    pdf.cell(0, 8, report_footer, align='R', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    
+    # 계량기 리셋 보정 사이클: ③은 ②-①이 아닌 리셋 전후 사용량의 합
+    if GAS_RESET_NOTE in row_data['비고']:
+        pdf.cell(0, 8, f"* {GAS_RESET_NOTE}: 사이클 중 계량기 지침이 리셋되어 ③은 리셋 전후 사용량의 합입니다.", align='R', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
     
     return pdf
 
 # ---------------------------------------------------------
 # 4.5 차트 생성 함수 (미리보기 및 PDF용)
 # ---------------------------------------------------------
-def plot_cycle_chart(row, full_raw, temp_holding_min, temp_holding_max, fig_width=10, fig_height=5):
-    """주어진 사이클 정보를 바탕으로 Matplotlib 차트를 생성하여 반환합니다."""
+# 차트 한 선에 그리는 최대 점 수 (12인치 x 100dpi 화면 폭보다 많은 점은 그려도 구분되지 않음)
+CHART_MAX_POINTS = 2000
+
+def minmax_decimate_index(values, max_points=CHART_MAX_POINTS):
+    """긴 시계열을 max_points 이하로 줄일 위치 인덱스(오름차순)를 반환합니다.
+    일정 개수씩 구간을 나눠 구간별 최소/최대 점을 남기므로 가스/온도 급변 구간의 모양이 유지됩니다."""
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+    
+    bucket = -(-n // (max_points // 2)) # 구간 크기 (올림)
+    padded = np.full(-(-n // bucket) * bucket, np.nan)
+    padded[:n] = values
+    padded = padded.reshape(-1, bucket)
+    # 결측은 최소/최대 후보에서 제외 (구간 전체가 결측이면 구간 첫 점이 선택됨)
+    low = np.where(np.isnan(padded), np.inf, padded).argmin(axis=1)
+    high = np.where(np.isnan(padded), -np.inf, padded).argmax(axis=1)
+    starts = np.arange(len(padded)) * bucket
+    idx = np.unique(np.concatenate(([0, n - 1], starts + low, starts + high)))
+    return idx[idx < n]
+
+def plot_cycle_chart(row, unit_raw, temp_holding_min, temp_holding_max, fig_width=10, fig_height=5, fig=None):
+    """주어진 사이클 정보를 바탕으로 Matplotlib 차트를 그려 반환합니다.
+    unit_raw는 해당 가열로의 (시간순 정렬된) 센서 데이터입니다.
+    fig를 넘기면 해당 Figure와 (이전 호출에서 만든) 온도/가스 축을 비우고 재사용합니다."""
     s_ts = pd.to_datetime(row['검침시작'])
     e_ts = pd.to_datetime(row['검침완료'])
     unit_id = row['가열로']
     
-    # 전체 데이터에서 해당 가열로의 데이터만 필터링
-    unit_raw = full_raw[full_raw['가열로'] == unit_id].copy()
+    # 앞뒤로 1시간 여유 두기 (정렬된 시각 배열에서 이진 탐색으로 구간 경계를 찾아 잘라냄)
+    margin_ns = pd.Timedelta(hours=1).value
+    unit_t_ns = to_int_ns(unit_raw['일시'].values)
+    lo = np.searchsorted(unit_t_ns, s_ts.value - margin_ns, side='left')
+    hi = np.searchsorted(unit_t_ns, e_ts.value + margin_ns, side='right')
+    chart_data = unit_raw.iloc[lo:hi]
     
-    # 앞뒤로 1시간 여유 두기
-    chart_data = unit_raw[(unit_raw['일시'] >= s_ts - timedelta(hours=1)) & (unit_raw['일시'] <= e_ts + timedelta(hours=1))].copy()
+    if fig is None:
+        fig = Figure()
+    fig.set_size_inches(fig_width, fig_height)
+    if len(fig.axes) == 2:
+        # 이전에 만든 온도(ax1)/가스(ax2) 축을 그대로 두고 내용만 지움 (Figure/Axes 재생성 생략)
+        ax1, ax2 = fig.axes
+        ax1.cla()
+        ax2.cla()
+    else:
+        fig.clear()
+        ax1 = fig.add_subplot(111)
+        ax2 = ax1.twinx()
     
-    fig, ax1 = plt.subplots(figsize=(fig_width, fig_height))
+    # 온도/가스 트렌드는 화면 해상도 수준으로 줄여서 그림 (구간별 최소/최대 점 유지)
+    chart_times = chart_data['일시'].values
+    chart_temps = chart_data['온도'].values
+    chart_gas = chart_data['가스지침'].values
+    temp_idx = minmax_decimate_index(chart_temps)
+    gas_idx = minmax_decimate_index(chart_gas)
     
     # 온도 트렌드
-    ax1.fill_between(chart_data['일시'], chart_data['온도'], color='red', alpha=0.3)
-    ax1.plot(chart_data['일시'], chart_data['온도'], 'r-', label='온도')
+    ax1.fill_between(chart_times[temp_idx], chart_temps[temp_idx], color='red', alpha=0.3)
+    ax1.plot(chart_times[temp_idx], chart_temps[temp_idx], 'r-', label='온도')
     ax1.set_ylabel('온도 (°C)', color='r')
     
     # 홀딩 구간 표시선
     ax1.axhline(y=temp_holding_min, color='gray', linestyle=':', alpha=0.5)
     ax1.axhline(y=temp_holding_max, color='gray', linestyle=':', alpha=0.5)
     
-    # 가스 지침 트렌드
-    ax2 = ax1.twinx()
-    ax2.plot(chart_data['일시'], chart_data['가스지침'], 'b-', label='가스지침')
+    # 가스 지침 트렌드 (cla() 후에도 오른쪽 축 유지)
+    ax2.yaxis.tick_right()
+    ax2.yaxis.set_label_position('right')
+    ax2.plot(chart_times[gas_idx], chart_gas[gas_idx], 'b-', label='가스지침')
     ax2.set_ylabel('가스지침 (Nm3)', color='b')
     
     # 시작/종료 포인트 마커
-    start_temp = chart_data.loc[chart_data['일시']>=s_ts, '온도'].iloc[0] if not chart_data.loc[chart_data['일시']>=s_ts, '온도'].empty else np.nan
-    end_temp = chart_data.loc[chart_data['일시']<=e_ts, '온도'].iloc[-1] if not chart_data.loc[chart_data['일시']<=e_ts, '온도'].empty else np.nan
+    chart_t_ns = to_int_ns(chart_times)
+    temps_after_start = chart_temps[chart_t_ns >= s_ts.value]
+    temps_before_end = chart_temps[chart_t_ns <= e_ts.value]
+    start_temp = temps_after_start[0] if len(temps_after_start) else np.nan
+    end_temp = temps_before_end[-1] if len(temps_before_end) else np.nan
     ax1.scatter([s_ts, e_ts], [start_temp, end_temp], color='green', s=100, zorder=5)
     
-    plt.title(f"가열로 {unit_id} Cycle: {row['검침시작']} ~ {row['검침완료']}")
+    ax1.set_title(f"가열로 {unit_id} Cycle: {row['검침시작']} ~ {row['검침완료']}")
     fig.autofmt_xdate() # X축 날짜 겹침 방지
     
     return fig
 
+@st.cache_data(max_entries=32, show_spinner=False)
+def render_cycle_png(raw_sig, unit_id, cycle_start, cycle_end, temp_holding_min, temp_holding_max, fig_width, fig_height, _unit_raw, _fig=None):
+    """사이클 차트를 PNG 바이트로 렌더링합니다. (재실행 시 같은 차트는 캐시에서 바로 반환하여 Matplotlib 생략)
+    캐시 키는 센서 데이터 서명(raw_sig)과 사이클 구간/차트 설정이며, _unit_raw/_fig는 해시하지 않습니다."""
+    cycle_key = (raw_sig, unit_id, cycle_start, cycle_end, temp_holding_min, temp_holding_max)
+    if _fig is not None and getattr(_fig, 'cycle_key', None) == cycle_key:
+        # 같은 사이클이 이미 그려진 Figure (예: 미리보기 후 PDF 생성)는 다시 그리지 않고 크기만 바꿔 저장
+        fig = _fig
+        fig.set_size_inches(fig_width, fig_height)
+    else:
+        row = {'가열로': unit_id, '검침시작': cycle_start, '검침완료': cycle_end}
+        fig = plot_cycle_chart(row, _unit_raw, temp_holding_min, temp_holding_max, fig_width=fig_width, fig_height=fig_height, fig=_fig)
+        fig.cycle_key = cycle_key
+    
+    # bbox_inches='tight'는 여백 계산용 렌더링을 한 번 더 하므로, 레이아웃만 맞춘 뒤 한 번에 저장
+    fig.tight_layout()
+    img_buf = io.BytesIO()
+    fig.savefig(img_buf, format='png')
+    return img_buf.getvalue()
+
 # ---------------------------------------------------------
 # 4.6 컬럼 선택을 위한 헬퍼 함수
 # ---------------------------------------------------------
@@ -488,6 +866,156 @@ def get_default_index(columns, keywords):
     # 키워드 일치 항목이 없으면 첫 번째 컬럼을 기본값으로 반환
     return 0 
 
+def style_achievement(col):
+    """달성여부 컬럼 전체의 Pass/Fail 색상 스타일을 한 번에 계산합니다. (Styler.apply용)"""
+    return np.where(col == 'Pass', 'background-color:#d4edda; color:#155724', 'background-color:#f8d7da; color:#721c24')
+
+def get_unit_results(df, selected_unit):
+    """선택한 가열로의 분석 결과를 세션에 한 번만 걸러 보관합니다. (탭 전환/날짜 선택 등 재실행 시 재필터링 생략)
+    새 분석이 완료되면 unit_views가 비워지므로 결과가 바뀐 뒤 이전 값이 쓰이지 않습니다."""
+    views = st.session_state.setdefault('unit_views', {})
+    if selected_unit not in views:
+        # 이후 탭에서는 읽기만 하므로 복사하지 않음 (비교는 NumPy 배열로 수행하여 pandas 비교 연산 경로 생략)
+        views[selected_unit] = df if selected_unit == '전체' else df[df['가열로'].to_numpy() == selected_unit]
+    return views[selected_unit]
+
+def get_report_candidates(df_filtered, selected_unit, use_target_cost):
+    """리포트 대상 사이클(목표 원단위 사용 시 Pass만)과 날짜별 리포트 행을 가열로별로 한 번만 계산해 반환합니다.
+    report_rows는 {날짜: 해당 날짜 첫 사이클의 dict}이며, 키 순서가 곧 날짜 선택 목록입니다.
+    use_target_cost는 분석 시점 값으로 고정되므로 가열로 ID만으로 구분합니다."""
+    candidates = st.session_state.setdefault('report_candidates', {})
+    if selected_unit not in candidates:
+        df_pass = df_filtered[df_filtered['달성여부'].to_numpy() == 'Pass'] if use_target_cost else df_filtered
+        df_first = df_pass.drop_duplicates('날짜')
+        report_rows = dict(zip(df_first['날짜'], df_first.to_dict('records')))
+        candidates[selected_unit] = (df_pass, report_rows)
+    return candidates[selected_unit]
+
+# 컬럼 지정 패널은 fragment로 실행하여, 패널 안의 selectbox 변경 시 패널만 다시 그림 (사이드바/결과 탭은 재실행하지 않음)
+# st.fragment 미지원(구버전) Streamlit에서는 일반 함수로 동작
+fragment = getattr(st, 'fragment', lambda func: func)
+
+@fragment
+def column_picker_panel(prod_file, sensor_file, p_header, s_header):
+    """미리보기와 컬럼 선택 UI를 그리고, 선택된 컬럼 이름을 st.session_state['column_map']에 저장합니다."""
+    try:
+        # 미리보기 데이터 로드 (첫 3줄) - 첫 번째 생산실적 파일 사용
+        # 제목행과 첫 3줄만 파싱하므로 큰 파일도 전체를 읽지 않음
+        df_p = peek_file(prod_file.getvalue(), prod_file.name, p_header)
+        df_s = peek_file(sensor_file.getvalue(), sensor_file.name, s_header)
+        
+        c1, c2 = st.columns(2)
+        
+        with c1:
+            st.caption("생산 실적 데이터")
+            st.dataframe(df_p)
+            
+            # 키워드 기반 기본 인덱스 설정
+            # '가열시작일시' 또는 '일시'를 우선 찾음
+            col_p_start_time_index = get_default_index(df_p.columns, ['가열시작일시', '시작일시', '일시', 'date', '시간'])
+            col_p_weight_index = get_default_index(df_p.columns, ['장입', '중량', 'weight', 'kg'])
+            col_p_unit_index = get_default_index(df_p.columns, ['가열로', '호기', 'unit', 'furnace', '명'])
+            
+            # 사용자가 원하는 컬럼 이름 직접 선택
+            # 날짜 컬럼 대신 '차지 시작 시각' 컬럼 선택으로 변경
+            col_p_start_time = st.selectbox("⏰ 차지 시작 시각 컬럼", 
+                                             ['None'] + df_p.columns.tolist(), # 'None' 옵션 추가
+                                             index=col_p_start_time_index + 1 if col_p_start_time_index != -1 else 0, # None을 0번 인덱스로 설정
+                                             key="p_start_time")
+            
+            if col_p_start_time == 'None':
+                col_p_start_time = None
+                st.warning("차지 시작 시각 정보가 없어 센서 패턴 분석으로 사이클을 예측합니다. 분석 정확도가 낮을 수 있습니다.")
+            
+            col_p_weight = st.selectbox("⚖️ 장입량 컬럼", df_p.columns, index=get_default_index(df_p.columns, ['장입', '중량', 'weight', 'kg']), key="p_weight")
+            col_p_unit = st.selectbox("🏭 생산 실적의 가열로 ID 컬럼", df_p.columns, index=get_default_index(df_p.columns, ['가열로', '호기', 'unit', 'furnace', '명']), key="p_unit")
+            
+        with c2:
+            st.caption("가열로 센서 데이터 (가열로 ID는 파일 이름에서 추출)")
+            st.dataframe(df_s)
+            
+            # 키워드 기반 기본 인덱스 설정
+            # '가스누적지침'을 최우선으로 탐색
+            col_s_time_index = get_default_index(df_s.columns, ['일시', '시간', 'time'])
+            col_s_temp_index = get_default_index(df_s.columns, ['온도', 'temp', '℃'])
+            col_s_gas_index = get_default_index(df_s.columns, ['가스누적지침', '가스', '지침', 'gas']) # '가스누적지침' 최우선
+
+            
+            # 사용자가 원하는 컬럼 이름 직접 선택
+            col_s_time = st.selectbox("⏰ 일시 컬럼", df_s.columns, index=col_s_time_index, key="s_time")
+            col_s_temp = st.selectbox("🔥 온도 컬럼", df_s.columns, index=col_s_temp_index, key="s_temp")
+            col_s_gas = st.selectbox("⛽ 가스지침 컬럼 (누적값)", df_s.columns, index=col_s_gas_index, key="s_gas")
+        
+        st.session_state['column_map'] = (col_p_start_time, col_p_weight, col_p_unit, col_s_time, col_s_temp, col_s_gas)
+        
+    except Exception as e:
+        st.error(f"데이터 미리보기에 실패했습니다. 제목행 설정을 확인하거나 파일 형식을 점검해주세요. (세부 오류: {e})")
+        st.session_state['column_map'] = (None, None, None, None, None, None)
+
+
+# 세션별로 보관하는 생성된 PDF 리포트 수 (날짜를 바꿔 가며 다시 받을 때 재생성 생략)
+PDF_CACHE_SIZE = 16
+
+@fragment
+def report_panel(df_filtered, selected_unit, use_target_cost, target_cost, temp_holding_min, temp_holding_max):
+    """리포트 탭(날짜 선택, 차트 미리보기, PDF 생성)을 그립니다.
+    fragment로 실행하여 날짜 선택/PDF 버튼 클릭 시 이 탭만 다시 실행합니다. (결과 표/통계 차트 재렌더링 생략)"""
+    # 리포트 생성 조건 설정
+    can_generate_report = False
+    if selected_unit == '전체':
+        st.warning("리포트는 개별 가열로를 선택했을 때만 생성이 가능합니다.")
+    elif df_filtered.empty:
+         st.warning(f"가열로 {selected_unit}의 분석 데이터가 없어 리포트 생성이 불가합니다.")
+    else:
+        # 목표 원단위를 사용하지 않는 경우, 모든 사이클을 리포트 대상으로 간주
+        df_pass, report_rows = get_report_candidates(df_filtered, selected_unit, use_target_cost)
+        if df_pass.empty:
+            st.warning(f"가열로 {selected_unit}의 목표 달성 데이터가 없어 리포트 생성이 불가합니다. (목표 원단위 사용 중)")
+        else:
+            can_generate_report = True
+
+    if can_generate_report:
+        s_date = st.selectbox("리포트 생성 대상 날짜 선택:", list(report_rows), key='report_date')
+    
+        # 선택한 날짜의 리포트 행은 미리 만든 dict에서 바로 조회 (마스크 검색/Series 생성 생략)
+        row = report_rows[s_date]
+    
+        # --- 차트 미리보기: 날짜 선택 시 바로 표시 ---
+        st.subheader("▶️ 열처리 Chart 미리보기 (온도/가스 트렌드)")
+    
+        # 차트 Figure는 세션별로 하나만 만들어 미리보기/PDF에서 재사용 (pyplot 전역 Figure 누적 방지)
+        if 'chart_fig' not in st.session_state:
+            st.session_state['chart_fig'] = Figure()
+        unit_raw = st.session_state['raw_by_unit'][row['가열로']]
+        chart_key = (st.session_state['raw_sig'], row['가열로'], row['검침시작'], row['검침완료'], temp_holding_min, temp_holding_max)
+    
+        # 차트 PNG 렌더링 (미리보기 크기 10x5, 같은 사이클/설정이면 캐시된 이미지 사용)
+        st.image(render_cycle_png(*chart_key, 10, 5, unit_raw, st.session_state['chart_fig']))
+    
+        # --- PDF 생성 버튼 (이미 만든 리포트는 세션 캐시에서 바로 다운로드) ---
+        pdf_cache = st.session_state.setdefault('pdf_cache', OrderedDict())
+        pdf_name = f"Report_{selected_unit}_{s_date}.pdf"
+        if chart_key in pdf_cache:
+            pdf_cache.move_to_end(chart_key)
+            st.download_button("📥 다운로드", pdf_cache[chart_key], pdf_name, "application/pdf")
+        elif st.button("PDF 리포트 생성", key='generate_pdf_button'):
+            with st.spinner("리포트 및 차트 생성 중..."):
+                # PDF용 차트 (리포트용 크기 12x5, 미리보기와 같은 캐시 사용)
+                img_buf = io.BytesIO(render_cycle_png(*chart_key, 12, 5, unit_raw, st.session_state['chart_fig']))
+            
+                # unit_name, use_target_cost, target_cost를 generate_pdf로 전달
+                pdf = generate_pdf(row, img_buf, target_cost, selected_unit, use_target_cost)
+                pdf_bytes = bytes(pdf.output()) # fpdf2는 bytearray를 반환
+                
+                # 최근 PDF_CACHE_SIZE개만 보관 (가장 오래 사용하지 않은 리포트부터 제거)
+                pdf_cache[chart_key] = pdf_bytes
+                if len(pdf_cache) > PDF_CACHE_SIZE:
+                    pdf_cache.popitem(last=False)
+                st.download_button("📥 다운로드", pdf_bytes, pdf_name, "application/pdf")
+            
+                st.success(f"PDF 리포트가 생성되었습니다. ({s_date})")
+
+
 # ---------------------------------------------------------
 # 5. 메인 UI
 # ---------------------------------------------------------
@@ -557,66 +1085,15 @@ def main():
         st.subheader("🛠️ 데이터 컬럼 지정 (미리보기)")
         st.warning("⚠️ **중요:** 생산 실적 데이터의 '차지 시작 시각 컬럼'은 개별 차지(작업)의 정확한 시작 시간을 포함해야 분석 정확도가 높습니다.")
         
-        try:
-            # 미리보기 데이터 로드 (첫 3줄) - 첫 번째 생산실적 파일 사용
-            df_p = smart_read_file(prod_files[0], p_header, 3)
-            prod_files[0].seek(0) # 파일 포인터 초기화
-            
-            f = sensor_files[0]; f.seek(0)
-            df_s = smart_read_file(f, s_header, 3)
-            f.seek(0) # 파일 포인터 초기화
-            
-            c1, c2 = st.columns(2)
-            
-            with c1:
-                st.caption("생산 실적 데이터")
-                st.dataframe(df_p)
-                
-                # 키워드 기반 기본 인덱스 설정
-                # '가열시작일시' 또는 '일시'를 우선 찾음
-                col_p_start_time_index = get_default_index(df_p.columns, ['가열시작일시', '시작일시', '일시', 'date', '시간'])
-                col_p_weight_index = get_default_index(df_p.columns, ['장입', '중량', 'weight', 'kg'])
-                col_p_unit_index = get_default_index(df_p.columns, ['가열로', '호기', 'unit', 'furnace', '명'])
-                
-                # 사용자가 원하는 컬럼 이름 직접 선택
-                # 날짜 컬럼 대신 '차지 시작 시각' 컬럼 선택으로 변경
-                col_p_start_time = st.selectbox("⏰ 차지 시작 시각 컬럼", 
-                                                 ['None'] + df_p.columns.tolist(), # 'None' 옵션 추가
-                                                 index=col_p_start_time_index + 1 if col_p_start_time_index != -1 else 0, # None을 0번 인덱스로 설정
-                                                 key="p_start_time")
-                
-                if col_p_start_time == 'None':
-                    col_p_start_time = None
-                    st.warning("차지 시작 시각 정보가 없어 센서 패턴 분석으로 사이클을 예측합니다. 분석 정확도가 낮을 수 있습니다.")
-                
-                col_p_weight = st.selectbox("⚖️ 장입량 컬럼", df_p.columns, index=get_default_index(df_p.columns, ['장입', '중량', 'weight', 'kg']), key="p_weight")
-                col_p_unit = st.selectbox("🏭 생산 실적의 가열로 ID 컬럼", df_p.columns, index=get_default_index(df_p.columns, ['가열로', '호기', 'unit', 'furnace', '명']), key="p_unit")
-                
-            with c2:
-                st.caption("가열로 센서 데이터 (가열로 ID는 파일 이름에서 추출)")
-                st.dataframe(df_s)
-                
-                # 키워드 기반 기본 인덱스 설정
-                # '가스누적지침'을 최우선으로 탐색
-                col_s_time_index = get_default_index(df_s.columns, ['일시', '시간', 'time'])
-                col_s_temp_index = get_default_index(df_s.columns, ['온도', 'temp', '℃'])
-                col_s_gas_index = get_default_index(df_s.columns, ['가스누적지침', '가스', '지침', 'gas']) # '가스누적지침' 최우선
-
-                
-                # 사용자가 원하는 컬럼 이름 직접 선택
-                col_s_time = st.selectbox("⏰ 일시 컬럼", df_s.columns, index=col_s_time_index, key="s_time")
-                col_s_temp = st.selectbox("🔥 온도 컬럼", df_s.columns, index=col_s_temp_index, key="s_temp")
-                col_s_gas = st.selectbox("⛽ 가스지침 컬럼 (누적값)", df_s.columns, index=col_s_gas_index, key="s_gas")
-                
-        except Exception as e:
-            st.error(f"데이터 미리보기에 실패했습니다. 제목행 설정을 확인하거나 파일 형식을 점검해주세요. (세부 오류: {e})")
-            col_p_start_time, col_p_weight, col_p_unit, col_s_time, col_s_temp, col_s_gas = None, None, None, None, None, None
+        # 선택 결과는 패널이 세션에 저장한 값을 사용 (패널만 다시 실행된 뒤에도 최신 선택 유지)
+        column_picker_panel(prod_files[0], sensor_files[0], p_header, s_header)
+        col_p_start_time, col_p_weight, col_p_unit, col_s_time, col_s_temp, col_s_gas = st.session_state['column_map']
 
         if run_btn: # 컬럼 선택이 완료되었을 때 실행 (col_p_start_time이 None일 수 있음)
             with st.spinner("정밀 분석 중... (사이클 탐색 및 원단위 계산)"):
                 # process_data 호출 시 prod_files 리스트 전달
                 # 인자 순서를 함수 정의와 일치시킴
-                res, raw, error_msg = process_data(prod_files, p_header, col_p_start_time, col_p_weight, col_p_unit, 
+                res, sensor_by_unit, error_msg = process_data(prod_files, p_header, col_p_start_time, col_p_weight, col_p_unit, 
                                                    s_header, col_s_time, col_s_temp, col_s_gas, sensor_files, 
                                                    target_cost, temp_start, temp_holding_min, temp_holding_max, duration_holding_min, temp_end, check_strict_start, use_target_cost, time_tolerance_hours, temp_rise_threshold, time_window_minutes)
                 
@@ -624,7 +1101,13 @@ def main():
                      st.error(f"분석 실패: {error_msg}")
                 elif res is not None and not res.empty:
                     st.session_state['res'] = res
-                    st.session_state['raw'] = raw
+                    # 새 결과 기준으로 가열로별 필터/리포트 대상 목록을 다시 계산하도록 비움
+                    st.session_state['unit_views'] = {}
+                    st.session_state['report_candidates'] = {}
+                    st.session_state['pdf_cache'] = OrderedDict()
+                    # 차트용 센서 데이터는 분석에 쓴 가열로별 분할본을 그대로 참조 (다시 분할/복사하지 않음)
+                    st.session_state['raw_sig'] = st.session_state['sensor_sig'] # 차트 캐시 키 (센서 데이터가 바뀌면 새로 렌더링)
+                    st.session_state['raw_by_unit'] = sensor_by_unit
                     # 분석된 가열로 ID 목록을 세션에 저장
                     st.session_state['unit_ids'] = res['가열로'].unique().tolist()
                     st.session_state['use_target_cost'] = use_target_cost # 세션에 저장
@@ -644,10 +1127,7 @@ def main():
         # 가열로별 분석 결과를 필터링하기 위한 selectbox
         selected_unit = st.selectbox("개별 가열로 선택 (종합 통계 및 리포트 대상):", ['전체'] + st.session_state['unit_ids'], key='unit_filter')
         
-        if selected_unit != '전체':
-            df_filtered = df[df['가열로'] == selected_unit].copy()
-        else:
-            df_filtered = df.copy()
+        df_filtered = get_unit_results(df, selected_unit)
             
         t1, t2, t3 = st.tabs(["📊 분석 결과", "📈 종합 통계", "📑 리포트"])
         
@@ -655,7 +1135,7 @@ def main():
             st.subheader(f"{selected_unit} 유효 사이클별 원단위 상세")
             # 목표 원단위를 사용하는 경우에만 Pass/Fail 색상 적용
             if use_target_cost:
-                st.dataframe(df_filtered.style.applymap(lambda x: 'background-color:#d4edda; color:#155724' if x=='Pass' else 'background-color:#f8d7da; color:#721c24', subset=['달성여부']), use_container_width=True)
+                st.dataframe(df_filtered.style.apply(style_achievement, subset=['달성여부']), use_container_width=True)
             else:
                 st.dataframe(df_filtered, use_container_width=True)
 
@@ -729,10 +1209,9 @@ def main():
                     
                     # 2. 시계열 차트 (추세)
                     fig_trend, ax_trend = plt.subplots(figsize=(10, 5))
-                    df_trend = df_filtered.copy()
-                    df_trend['날짜'] = pd.to_datetime(df_trend['날짜'])
+                    trend_dates = pd.to_datetime(df_filtered['날짜']) # 날짜 컬럼만 변환 (결과 전체를 복사하지 않음)
 
-                    ax_trend.plot(df_trend['날짜'], df_trend['원단위'], marker='o', linestyle='-', color='b', label='실적 원단위')
+                    ax_trend.plot(trend_dates, df_filtered['원단위'], marker='o', linestyle='-', color='b', label='실적 원단위')
                     
                     if use_target_cost:
                         ax_trend.axhline(target_cost, color='r', linestyle='--', linewidth=2, label=f'목표 ({target_cost:.2f})')
@@ -748,57 +1227,7 @@ def main():
                  st.warning("분석할 유효 데이터가 없습니다.")
 
         with t3:
-            # 리포트 생성 조건 설정
-            can_generate_report = False
-            if selected_unit == '전체':
-                st.warning("리포트는 개별 가열로를 선택했을 때만 생성이 가능합니다.")
-            elif df_filtered.empty:
-                 st.warning(f"가열로 {selected_unit}의 분석 데이터가 없어 리포트 생성이 불가합니다.")
-            elif use_target_cost:
-                df_pass = df_filtered[df_filtered['달성여부'] == 'Pass']
-                if df_pass.empty:
-                    st.warning(f"가열로 {selected_unit}의 목표 달성 데이터가 없어 리포트 생성이 불가합니다. (목표 원단위 사용 중)")
-                else:
-                    can_generate_report = True
-            else: # 목표 원단위를 사용하지 않는 경우, 모든 사이클을 리포트 대상으로 간주
-                df_pass = df_filtered.copy()
-                can_generate_report = True
-
-            if can_generate_report:
-                s_date = st.selectbox("리포트 생성 대상 날짜 선택:", df_pass['날짜'].unique(), key='report_date')
-                
-                row = df_pass[df_pass['날짜'] == s_date].iloc[0]
-                
-                # --- 차트 미리보기: 날짜 선택 시 바로 표시 ---
-                st.subheader("▶️ 열처리 Chart 미리보기 (온도/가스 트렌드)")
-                
-                # plot_cycle_chart 호출하여 fig 생성 (미리보기 크기 10x5)
-                fig_preview = plot_cycle_chart(row, st.session_state['raw'], temp_holding_min, temp_holding_max, fig_width=10, fig_height=5)
-                st.pyplot(fig_preview)
-                plt.close(fig_preview) # 메모리 해제
-                
-                # --- PDF 생성 버튼 ---
-                if st.button("PDF 리포트 생성", key='generate_pdf_button'):
-                    with st.spinner("리포트 및 차트 생성 중..."):
-                        # PDF용 차트 (리포트용 크기 12x5)
-                        fig_pdf = plot_cycle_chart(row, st.session_state['raw'], temp_holding_min, temp_holding_max, fig_width=12, fig_height=5)
-                        
-                        # 임시 파일에 저장
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp:
-                            fig_pdf.savefig(tmp.name, bbox_inches='tight')
-                            img_path = tmp.name
-                        
-                        plt.close(fig_pdf)
-                        
-                        try:
-                            # unit_name, use_target_cost, target_cost를 generate_pdf로 전달
-                            pdf = generate_pdf(row, img_path, target_cost, selected_unit, use_target_cost)
-                            pdf_bytes = pdf.output(dest='S').encode('latin-1')
-                            st.download_button("📥 다운로드", pdf_bytes, f"Report_{selected_unit}_{s_date}.pdf", "application/pdf")
-                        finally:
-                            os.remove(img_path)
-                        
-                        st.success(f"PDF 리포트가 생성되었습니다. ({s_date})")
+            report_panel(df_filtered, selected_unit, use_target_cost, target_cost, temp_holding_min, temp_holding_max)
 
 if __name__ == "__main__":
     main()